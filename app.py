@@ -1,69 +1,186 @@
+import hmac
 import streamlit as st
 st.set_page_config(layout="wide")  # Must be first command
 
+# === Password gate (set APP_PASSWORD in Secrets to enable) ===
+# Checked before the heavy imports so locked-out reruns stay cheap
+app_password = str(st.secrets.get("APP_PASSWORD", ""))
+if app_password:
+    pw = st.sidebar.text_input("Password", type="password")
+    if not hmac.compare_digest(pw.encode(), app_password.encode()):
+        st.error("🔒 Enter the password in the sidebar to view the tracker.")
+        st.stop()
+
+import numpy as np
 import pandas as pd
 import gspread
 from google.oauth2.service_account import Credentials
 import plotly.express as px
+import plotly.io as pio
+import re
 from datetime import date
 
 # === Google Sheets Authentication using Streamlit Secrets ===
 # Make sure you've added your full service-account JSON under [gcp_service_account] in Secrets
-creds = Credentials.from_service_account_info(
-    st.secrets["gcp_service_account"],
-    scopes=[
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ],
-)
-client = gspread.authorize(creds)
-ws = client.open("EV Tracker").worksheet("Sheet1")
+@st.cache_resource
+def get_ws():
+    creds = Credentials.from_service_account_info(
+        st.secrets["gcp_service_account"],
+        scopes=[
+            "https://www.googleapis.com/auth/spreadsheets",
+            "https://www.googleapis.com/auth/drive"
+        ],
+    )
+    client = gspread.authorize(creds)
+    return client.open("EV Tracker").worksheet("Sheet1")
 
-# === Load all rows ===
-all_values = ws.get_all_values()
-if len(all_values) < 2:
-    st.error("No data found in the sheet.")
-    st.stop()
-headers = all_values[0]
-records = [dict(zip(headers, row + [""]*(len(headers)-len(row)))) for row in all_values[1:]]
-df = pd.DataFrame(records)
+ws = get_ws()
 
-# === Ensure expected columns ===
 expected_cols = ["Date Placed","Stake ($)","EV","Odds","Profit/Loss","Result","Game Name","Sport"]
-for col in expected_cols:
-    if col not in df.columns:
-        df[col] = ""
-
-# === Clean & normalize data ===
-df["Stake ($)"] = df["Stake ($)"].replace('[\$,]', '', regex=True).fillna('0').astype(float)
-# Clean Profit/Loss: strip $ and commas, convert blanks to 0, coerce errors
-df["Profit/Loss"] = (pd.to_numeric(
-    df["Profit/Loss"].astype(str)
-       .replace('[\$,]', '', regex=True)
-       .replace('', '0'),
-    errors='coerce'
-).fillna(0.0))
-def parse_ev(val):
-    try:
-        return float(val)
-    except:
-        try:
-            return float(val.replace('%',''))/100
-        except:
-            return 0.0
-df['EV'] = df['EV'].apply(parse_ev)
-df['Result'] = df['Result'].fillna('').replace('', 'Pending')
-df['Sport'] = df['Sport'].fillna('').replace('', 'Unknown')
-
-# === Profit calculations ===
-def calc_real(r):
-    if r['Result']=='Win': return r['Profit/Loss'] - r['Stake ($)']
-    if r['Result']=='Loss': return -r['Stake ($)']
-    if r['Result']=='Cashed Out': return r['Profit/Loss'] - r['Stake ($)']
-    return 0
-def calc_expected(r): return r['Stake ($)'] * r['EV']
-df['Real Profit'] = df.apply(calc_real, axis=1)
-df['Expected Profit'] = df.apply(calc_expected, axis=1)
+RESULTS = ["Win","Loss","Cashed Out","Pending"]
+NUM_COLS = ["Date Placed","Stake ($)","EV","Profit/Loss","Real Profit","Expected Profit","Result","Sport"]
+META_COLS = ["Odds","Game Name","SheetRow"]
+
+# === Clean raw sheet rows into (numeric frame, display-only frame, daily rollup) ===
+def clean_bets(headers, rows, sheet_rows):
+    width = len(headers)
+    rows = [row[:width] + [""]*(width-len(row)) for row in rows]
+    df = pd.DataFrame(rows, columns=headers)
+    df.insert(len(df.columns), 'SheetRow', np.asarray(sheet_rows, dtype=np.int32))
+
+    # === Ensure expected columns ===
+    for col in expected_cols:
+        if col not in df.columns:
+            df[col] = ""
+
+    # === Clean & normalize data ===
+    # Numbers arrive ready to use; only cells stored as text (e.g. "$1,234") need $ and commas stripped
+    for c in ["Stake ($)", "Profit/Loss"]:
+        vals = pd.to_numeric(df[c], errors='coerce')
+        text = vals.isna().to_numpy() & (df[c] != '').to_numpy()
+        if text.any():
+            vals[text] = pd.to_numeric(
+                df.loc[text, c].astype(str).str.replace('$', '', regex=False).str.replace(',', '', regex=False),
+                errors='coerce'
+            )
+        df[c] = vals.fillna(0.0).astype(np.float32)
+    # Parse EV: plain decimals as-is, percentages ("5%") divided by 100, anything else 0
+    ev = df['EV'].astype(str).str.strip()
+    has_pct = ev.str.contains('%', regex=False).to_numpy()
+    ev_vals = pd.to_numeric(ev.str.replace('%', '', regex=False), errors='coerce').fillna(0.0).to_numpy()
+    df['EV'] = np.where(has_pct, ev_vals/100.0, ev_vals).astype(np.float32)
+    df['Result'] = df['Result'].fillna('').replace('', 'Pending')
+    df['Sport'] = df['Sport'].fillna('').replace('', 'Unknown')
+    # Low-cardinality columns as categoricals; known results first so their codes are fixed
+    extra_results = sorted(set(df['Result'].unique()) - set(RESULTS))
+    df['Result'] = df['Result'].astype(pd.CategoricalDtype(RESULTS + extra_results))
+    df['Sport'] = df['Sport'].astype('category')
+    df['Date Placed'] = pd.to_datetime(df['Date Placed'], dayfirst=True, errors='coerce')
+    df = df.dropna(subset=['Date Placed'])
+    # Daily bets only need second resolution; float32 is plenty for bet-sized amounts
+    df['Date Placed'] = df['Date Placed'].astype('datetime64[s]')
+    # Keep bets in date order (stable, so same-day bets keep sheet order) so the chart can skip re-sorting
+    df = df.sort_values('Date Placed', kind='mergesort')
+
+    # === Profit calculations ===
+    pl = df['Profit/Loss'].to_numpy(dtype=np.float32)
+    stake = df['Stake ($)'].to_numpy(dtype=np.float32)
+    res = df['Result'].cat.codes.to_numpy()
+    df['Real Profit'] = np.select(
+        [res==RESULTS.index('Win'), res==RESULTS.index('Loss'), res==RESULTS.index('Cashed Out')],
+        [pl - stake, -stake, pl - stake],
+        default=np.float32(0.0)
+    )
+    df['Expected Profit'] = stake * df['EV'].to_numpy(dtype=np.float32)
+
+    # Per-day rollup for the chart, so reruns only group the small (date, result, sport) frame
+    # (summed in float64: float32 running totals drift by cents)
+    profits = df[['Real Profit','Expected Profit']].astype(np.float64)
+    daily = profits.groupby([df['Date Placed'], df['Result'], df['Sport']], observed=True).sum().reset_index()
+
+    # Numeric/categorical columns for filtering and maths; display-only strings kept aside
+    num_df = df[NUM_COLS]
+    # Unformatted fetches mix ints, floats and strings here; keep display columns as plain text
+    meta_df = df[META_COLS].astype({"Odds": str, "Game Name": str})
+    return num_df, meta_df, daily
+
+# === Load all rows (cached between reruns; cleared by "Sync with Sheet") ===
+@st.cache_data(ttl=60, show_spinner=False)
+def load_bets():
+    # Numbers arrive as floats/ints (no "$1,234.00" strings to clean); dates stay formatted strings
+    all_values = get_ws().get(
+        "A:H",
+        value_render_option="UNFORMATTED_VALUE",
+        date_time_render_option="FORMATTED_STRING",
+    )
+    if len(all_values) < 2:
+        return None
+    # Sheet row number of each bet (row 1 is the header); the last fetched row is returned too
+    # so locally added bets are recognised even if cleaning drops their row
+    return clean_bets(all_values[0], all_values[1:], np.arange(2, len(all_values)+1)) + (len(all_values),)
+
+def concat_bets(a, b):
+    """Concatenate two cleaned frames, merging the categories of Result and Sport."""
+    out = pd.concat([a, b], ignore_index=True)
+    for col in ['Result','Sport']:
+        if col in out.columns:
+            cats = pd.api.types.union_categoricals([a[col], b[col]]).categories
+            out[col] = out[col].astype(pd.CategoricalDtype(cats))
+    return out
+
+# === Chart downsampling ===
+MAX_CHART_POINTS = 1000
+
+def lttb_indices(x, y, n_out):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling."""
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i+1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        nxt_lo, nxt_hi = hi, (edges[i+2] if i + 2 < len(edges) else n)
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        keep[i+1] = a
+    return keep
+
+# === Chart figure (cached per filter selection; returned as JSON so cached copies stay cheap) ===
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_chart(daily, results_key, sports_key):
+    daily_f = daily[daily['Result'].isin(results_key) & daily['Sport'].isin(sports_key)]
+    chart_df = daily_f.groupby('Date Placed', sort=False, observed=True)[['Real Profit','Expected Profit']].sum().cumsum().reset_index()
+    if len(chart_df) > MAX_CHART_POINTS:
+        # Keep the LTTB points of both lines so they still share one x axis; half the budget
+        # each so the union stays within MAX_CHART_POINTS
+        x = chart_df['Date Placed'].to_numpy().astype(np.int64)
+        keep = np.union1d(
+            lttb_indices(x, chart_df['Real Profit'].to_numpy(), MAX_CHART_POINTS // 2),
+            lttb_indices(x, chart_df['Expected Profit'].to_numpy(), MAX_CHART_POINTS // 2),
+        )
+        chart_df = chart_df.iloc[keep]
+    fig = px.line(
+        chart_df,
+        x='Date Placed',
+        y=['Expected Profit','Real Profit'],
+        title='Profit vs Expected Over Time',
+        labels={'value':'Cumulative Profit (A$)'}
+    )
+    fig.update_layout(xaxis=dict(rangeslider=dict(visible=True), type='date'))
+    return fig.to_json()
+
+bets = load_bets()
+if bets is None:
+    st.error("No data found in the sheet.")
+    st.stop()
+num_df, meta_df, daily, last_sheet_row = bets
 
 # === Sidebar: Add New Bet ===
 st.sidebar.header("➕ Add New Bet")
@@ -73,37 +190,60 @@ with st.sidebar.form("add_bet_form"):
     new_ev = st.number_input("EV (decimal)", min_value=0.0, format="%.3f")
     new_odds = st.text_input("Odds")
     new_profit = st.number_input("Profit/Loss ($)", format="%.2f")
-    new_result = st.selectbox("Result", ["Win","Loss","Cashed Out","Pending"], index=3)
+    new_result = st.selectbox("Result", RESULTS, index=3)
     new_game = st.text_input("Game Name")
     new_sport = st.selectbox("Sport", ["Basketball","Football"], index=0)
     if st.form_submit_button("Add Bet"):
-        ws.append_row([
+        new_row = [
             new_date.strftime("%d-%m-%Y"), new_stake, new_ev, new_odds, new_profit,
             new_result, new_game, new_sport
-        ], value_input_option="USER_ENTERED")
-        st.sidebar.success("Bet added! Refresh to update.")
+        ]
+        resp = ws.append_row(new_row, value_input_option="USER_ENTERED")
+        # Keep the bet locally (keyed by its sheet row) until the cached fetch includes it
+        sheet_row = int(re.search(r'![A-Z]+(\d+)', resp['updates']['updatedRange']).group(1))
+        st.session_state.setdefault('new_bets', []).append((sheet_row, new_row))
+        st.sidebar.success("Bet added!")
+
+if st.sidebar.button("🔄 Sync with Sheet"):
+    load_bets.clear()
+    st.session_state['new_bets'] = []
+    st.rerun()
+
+# === Merge locally added bets not yet in the cached fetch ===
+pending = [b for b in st.session_state.get('new_bets', []) if b[0] > last_sheet_row]
+st.session_state['new_bets'] = pending
+if pending:
+    new_num, new_meta, new_daily = clean_bets(expected_cols, [r for _, r in pending], [n for n, _ in pending])
+    num_df = concat_bets(num_df, new_num).sort_values('Date Placed', kind='mergesort')
+    meta_df = concat_bets(meta_df, new_meta)
+    daily = concat_bets(daily, new_daily).sort_values('Date Placed', kind='mergesort')
 
 st.sidebar.markdown("---")
 # === Sidebar: Filters & Settings ===
+all_results = num_df['Result'].unique().tolist()
+all_sports = num_df['Sport'].unique().tolist()
 selected_results = st.sidebar.multiselect(
-    "Result", df['Result'].unique().tolist(), default=df['Result'].unique().tolist()
+    "Result", all_results, default=all_results
 )
 selected_sports = st.sidebar.multiselect(
-    "Sport", [s for s in df['Sport'].unique() if s!='Unknown'],
-    default=[s for s in df['Sport'].unique() if s!='Unknown']
+    "Sport", [s for s in all_sports if s!='Unknown'],
+    default=[s for s in all_sports if s!='Unknown']
 )
 initial_capital = st.sidebar.number_input("Initial Capital (A$)", min_value=0.0, value=500.0, step=50.0)
 
 # === Filter data ===
-df_f = df[df['Result'].isin(selected_results) & df['Sport'].isin(selected_sports)].copy()
-if not df_f.empty:
-    df_f['Date Placed'] = pd.to_datetime(df_f['Date Placed'], dayfirst=True, errors='coerce')
-    df_f = df_f.dropna(subset=['Date Placed'])
+# Nothing is filtered out when every present value is selected, so reuse the frame as-is
+if set(selected_results) >= set(all_results) and set(selected_sports) >= set(all_sports):
+    df_f = num_df
+else:
+    mask = num_df['Result'].isin(selected_results).to_numpy() & num_df['Sport'].isin(selected_sports).to_numpy()
+    df_f = num_df[mask]  # read-only below, no copy needed
 
 # === Metrics ===
 st.title("📊 EV Betting Tracker Dashboard")
-profit = df_f['Real Profit'].sum()
-turnover = df_f['Stake ($)'].sum()
+# Columns are stored as float32 but summed in float64 so totals keep their cents
+profit = float(df_f['Real Profit'].to_numpy().sum(dtype=np.float64))
+turnover = float(df_f['Stake ($)'].to_numpy().sum(dtype=np.float64))
 yield_pct = profit/turnover*100 if turnover else 0
 roi_pct = profit/initial_capital*100 if initial_capital else 0
 bets_count = len(df_f)
@@ -116,17 +256,18 @@ cols[4].metric("ROI", f"{roi_pct:.2f}%")
 
 # === Chart ===
 st.subheader("📈 Profit & Expected Profit Over Time")
-chart_df = df_f.groupby('Date Placed')[['Real Profit','Expected Profit']].sum().cumsum().reset_index()
-fig = px.line(
-    chart_df,
-    x='Date Placed',
-    y=['Expected Profit','Real Profit'],
-    title='Profit vs Expected Over Time',
-    labels={'value':'Cumulative Profit (A$)'}
-)
-fig.update_layout(xaxis=dict(rangeslider=dict(visible=True), type='date'))
+fig = pio.from_json(build_chart(daily, tuple(sorted(selected_results)), tuple(sorted(selected_sports))))
 st.plotly_chart(fig, use_container_width=True)
 
 # === Table ===
 st.subheader("📋 Bet Details")
-st.dataframe(df_f[expected_cols])
+# Only the most recent rows go to the browser; the full export is built on demand
+rows_to_show = st.slider("Rows to show", 50, 2000, 200, step=50)
+st.dataframe(df_f.tail(rows_to_show).join(meta_df)[expected_cols], use_container_width=True, hide_index=True)
+if st.checkbox("Prepare CSV download"):
+    st.download_button(
+        "⬇️ Download CSV",
+        df_f.join(meta_df)[expected_cols].to_csv(index=False).encode(),
+        file_name="ev_bets.csv",
+        mime="text/csv",
+    )